@@ -0,0 +1,104 @@
+import os
+import shutil
+import sys
+import tempfile
+import filterLicense
+import tailDebugLog
+
+SAMPLES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "samples")
+SAMPLE_LOG = os.path.join(SAMPLES_FOLDER, "license.log")
+ROTATED_LOG = os.path.join(SAMPLES_FOLDER, "license_rotated.log")
+PARTIAL_LINE_REST = 'se" ckent@WS104  \n'
+
+
+def empty_model():
+    """Returns the usage model filterLicense would build from an lmstat dump with no checkouts."""
+    return {
+        "aa_r": {"issued": 2, "used": 0, "users": []},
+        "anshpc": {"issued": 16, "used": 0, "users": []},
+        "cfd_base": {"issued": 1, "used": 0, "users": []},
+    }
+
+
+def summarize(license_data):
+    """Reduces the model to (used, denied, [(user, count, start date)]) per license."""
+    return {
+        lic: (data["used"], data.get("denied", 0), [(user["User"], user.get("Count", 1), user["Start_date"]) for user in data["users"]])
+        for lic, data in license_data.items()
+    }
+
+
+def apply_new_events(log_file, state, license_data):
+    events, rotated = tailDebugLog.read_new_events(log_file, state)
+    for event in events:
+        tailDebugLog.apply_event(license_data, event)
+    return rotated
+
+
+def main():
+    """Replays the recorded debug logs through the tailer and checks the resulting usage model."""
+    failures = []
+
+    def check(name, actual, expected):
+        if actual != expected:
+            failures.append(f"{name}: expected {expected}, got {actual}")
+
+    workdir = tempfile.mkdtemp(prefix="debug_log_replay_")
+    log_file = os.path.join(workdir, "license.log")
+    shutil.copy(SAMPLE_LOG, log_file)
+    state = {}
+    license_data = empty_model()
+
+    # First read: the unfinished IN line for cfd_base must be left for later,
+    # and the checkout after midnight belongs to the next day although no TIMESTAMP says so
+    rotated = apply_new_events(log_file, state, license_data)
+    check("first read rotation", rotated, True)
+    check("first read", summarize(license_data), {
+        "aa_r": (2, 1, [("asmith", 1, "10/19"), ("bwayne", 1, "10/20")]),
+        "anshpc": (2, 0, [("bwayne", 2, "10/19")]),
+        "cfd_base": (1, 0, [("ckent", 1, "10/19")]),
+    })
+    check("date after midnight", state["date"], "10/20/2026")
+    check("denied counts stored", filterLicense.build_license_rows(license_data),
+          [("aa_r", 2, 2, 1), ("anshpc", 16, 2, 0), ("cfd_base", 1, 1, 0)])
+
+    # The daemon finishes the line
+    with open(log_file, "a") as file:
+        file.write(PARTIAL_LINE_REST)
+    rotated = apply_new_events(log_file, state, license_data)
+    check("completed line rotation", rotated, False)
+    check("completed line", summarize(license_data)["cfd_base"], (0, 0, []))
+    check("offset at end of file", state["offset"], os.path.getsize(log_file))
+
+    # Nothing new: offset stays put
+    offset = state["offset"]
+    apply_new_events(log_file, state, license_data)
+    check("idle read offset", state["offset"], offset)
+
+    # The log is rotated: a new file replaces the old one
+    rotated_copy = os.path.join(workdir, "license.log.new")
+    shutil.copy(ROTATED_LOG, rotated_copy)
+    os.replace(rotated_copy, log_file)
+    rotated = apply_new_events(log_file, state, license_data)
+    check("rotation detected", rotated, True)
+    check("after rotation", summarize(license_data), {
+        "aa_r": (2, 1, [("asmith", 1, "10/19"), ("bwayne", 1, "10/20")]),
+        "anshpc": (10, 0, [("bwayne", 2, "10/19"), ("asmith", 8, "10/20")]),
+        "cfd_base": (1, 1, [("jdoe", 1, "10/20")]),
+    })
+
+    # replay_log on a finished recording gives the same model as following it live
+    replayed = tailDebugLog.replay_log(ROTATED_LOG, empty_model())
+    check("replay_log", summarize(replayed)["anshpc"], (8, 0, [("asmith", 8, "10/20")]))
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        return 1
+    print("Debug log replay OK.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
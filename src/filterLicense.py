@@ -1,7 +1,32 @@
 import sqlite3
 import re
 import os
-from datetime import datetime
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# A short busy timeout plus a few backed-off retries bounds how long the GUI can block on a lock (about 13 s)
+DB_TIMEOUT = 2           # seconds SQLite waits on a locked database per attempt
+DB_RETRIES = 5
+SNAPSHOT_MAX_AGE = 600            # seconds before an older snapshot of a writer is pruned
+PINNED_SNAPSHOT_MAX_AGE = 86400   # seconds the newest snapshot of each writer is kept, so open GUIs can still read it
+
+# Columns the current snapshot layout needs; snapshots are transient, so an older layout is rebuilt
+SNAPSHOT_COLUMNS = {
+    "Snapshot": ("Snapshot_ID", "Created", "Writer_ID", "Source"),
+    "temp_data": ("Row_ID", "Snapshot_ID"),
+    "Snapshot_License": ("Snapshot_ID", "License", "Issued", "Used", "Denied"),
+}
+
+# Snapshot sources: a GUI refresh from lmstat, or the debug log tailer's live feed
+SOURCE_LMSTAT = "lmstat"
+SOURCE_DEBUG_LOG = "debug_log"
+
+# Writer id per process; keyed by PID so a forked child never shares its parent's id
+WRITER_IDS = {}
+
+# Databases whose snapshot tables this process has already checked; the check takes a write lock
+CHECKED_DATABASES = set()
 
 def convert_to_sqlite_datetime(start_time_str):
     try:
@@ -17,28 +42,106 @@ def convert_decimal_hours_to_hm(decimal_hours):
     minutes = round((decimal_hours - hours) * 60)
     return f"{hours}h {minutes}m"
 
-def setup_database(db_file):
-    conn = sqlite3.connect(db_file)
+def connect_database(db_file):
+    conn = sqlite3.connect(db_file, timeout=DB_TIMEOUT)
+    # WAL lets readers keep working while another process writes a snapshot
+    run_with_retry(conn.execute, "PRAGMA journal_mode=WAL")
+    return conn
+
+def run_with_retry(func, *args):
+    for attempt in range(DB_RETRIES):
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            if ("locked" not in str(e) and "busy" not in str(e)) or attempt == DB_RETRIES - 1:
+                raise
+            time.sleep(0.1 * 2 ** attempt)
+
+def writer_id():
+    # Identifies this process's snapshots; unlike a PID it is never reused by a later process
+    return WRITER_IDS.setdefault(os.getpid(), uuid.uuid4().hex)
+
+def snapshot_layout_outdated(cursor):
+    for table, columns in SNAPSHOT_COLUMNS.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        if not {row[1] for row in cursor.fetchall()}.issuperset(columns):
+            return True
+    return False
+
+def create_snapshot_tables(conn):
     cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS temp_data (
-            License TEXT,
-            User TEXT,
-            Hostname TEXT,
-            Display TEXT,
-            PID INTEGER,
-            Version TEXT,
-            Server TEXT,
-            Start_day TEXT,
-            Start_date TEXT,
-            Start_time TEXT,
-            Duration_Hours TEXT
-        )
-    ''')
-    conn.commit()
-    cursor.execute("DELETE FROM temp_data")
-    conn.commit()
-    return conn, cursor
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        if snapshot_layout_outdated(cursor):
+            # Missing or older snapshot tables only hold transient data, so they are rebuilt together
+            for table in SNAPSHOT_COLUMNS:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Snapshot (
+                Snapshot_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                Created TEXT NOT NULL,
+                Writer_ID TEXT NOT NULL,
+                Source TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS temp_data (
+                Row_ID INTEGER PRIMARY KEY,
+                Snapshot_ID INTEGER NOT NULL,
+                License TEXT,
+                User TEXT,
+                Hostname TEXT,
+                Display TEXT,
+                PID INTEGER,
+                Version TEXT,
+                Server TEXT,
+                Start_day TEXT,
+                Start_date TEXT,
+                Start_time TEXT,
+                Duration_Hours TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Snapshot_License (
+                Snapshot_ID INTEGER NOT NULL,
+                License TEXT NOT NULL,
+                Issued INTEGER NOT NULL,
+                Used INTEGER NOT NULL,
+                Denied INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (Snapshot_ID, License)
+            )
+        ''')
+        # Covers the per-snapshot user listing of the GUI and the pruning of old snapshots
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_temp_data_snapshot
+            ON temp_data (Snapshot_ID, License, User, Start_day, Start_date, Start_time, Duration_Hours)
+        ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def ensure_snapshot_tables(conn, db_file):
+    # Runs the schema check and migration once per process instead of on every refresh
+    db_path = os.path.abspath(db_file)
+    if db_path not in CHECKED_DATABASES:
+        run_with_retry(create_snapshot_tables, conn)
+        CHECKED_DATABASES.add(db_path)
+
+def setup_database(db_file):
+    conn = connect_database(db_file)
+    ensure_snapshot_tables(conn, db_file)
+    return conn, conn.cursor()
+
+def latest_snapshot_id(cursor):
+    cursor.execute("SELECT MAX(Snapshot_ID) FROM Snapshot")
+    return cursor.fetchone()[0]
+
+def latest_source_snapshot(cursor, source, max_age):
+    # Returns (Snapshot_ID, Created) of the newest snapshot of a source written within max_age seconds, or None
+    since = (datetime.now() - timedelta(seconds=max_age)).strftime("%Y-%m-%d %H:%M:%S")
+    cursor.execute("SELECT Snapshot_ID, Created FROM Snapshot WHERE Source = ? AND Created >= ? ORDER BY Snapshot_ID DESC LIMIT 1", (source, since))
+    return cursor.fetchone()
 
 def load_target_licenses(cursor):
     cursor.execute("SELECT License FROM License")
@@ -86,7 +189,8 @@ def parse_output_file(output_file, target_licenses):
                     })
     return license_data
 
-def insert_into_database(cursor, conn, license_data):
+def build_rows(license_data):
+    rows = []
     for lic, data in license_data.items():
         for user in data["users"]:
             try:
@@ -95,34 +199,80 @@ def insert_into_database(cursor, conn, license_data):
                 duration_hours = convert_decimal_hours_to_hm((datetime.now() - start_dt).total_seconds() / 3600)
             except ValueError:
                 duration_hours = None
+            rows.append((lic, user["User"], user["Hostname"], user["Display"], user["PID"], user["Version"], user["Server"], user["Start_day"], user["Start_date"], user["Start_time"], duration_hours))
+    return rows
+
+def build_license_rows(license_data):
+    # Only the debug log tailer counts DENIED lines; lmstat reports none
+    return [(lic, data["issued"], data["used"], data.get("denied", 0)) for lic, data in license_data.items()]
+
+def prune_snapshots(cursor):
+    # Older snapshots expire after SNAPSHOT_MAX_AGE; the newest one of each writer stays pinned much longer
+    now = datetime.now()
+    cursor.execute("""
+        SELECT Snapshot_ID FROM Snapshot
+        WHERE Created < ?
+          AND (Created < ? OR Snapshot_ID NOT IN (SELECT MAX(Snapshot_ID) FROM Snapshot GROUP BY Writer_ID))
+    """, ((now - timedelta(seconds=SNAPSHOT_MAX_AGE)).strftime("%Y-%m-%d %H:%M:%S"),
+          (now - timedelta(seconds=PINNED_SNAPSHOT_MAX_AGE)).strftime("%Y-%m-%d %H:%M:%S")))
+    expired = cursor.fetchall()
+    cursor.executemany("DELETE FROM temp_data WHERE Snapshot_ID = ?", expired)
+    cursor.executemany("DELETE FROM Snapshot_License WHERE Snapshot_ID = ?", expired)
+    cursor.executemany("DELETE FROM Snapshot WHERE Snapshot_ID = ?", expired)
 
-            cursor.execute('''INSERT INTO temp_data (License, User, Hostname, Display, PID, Version, Server, Start_day, Start_date, Start_time, Duration_Hours)
-                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                           (lic, user["User"], user["Hostname"], user["Display"], user["PID"], user["Version"], user["Server"], user["Start_day"], user["Start_date"], user["Start_time"], duration_hours))
-    conn.commit()
+def write_snapshot(cursor, conn, rows, license_rows, source):
+    # Each refresh writes its own snapshot in one transaction, so concurrent writers never see each other's half-written rows
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("INSERT INTO Snapshot (Created, Writer_ID, Source) VALUES (?, ?, ?)",
+                       (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), writer_id(), source))
+        snapshot_id = cursor.lastrowid
+        cursor.executemany('''INSERT INTO temp_data (Snapshot_ID, License, User, Hostname, Display, PID, Version, Server, Start_day, Start_date, Start_time, Duration_Hours)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                           [(snapshot_id,) + row for row in rows])
+        cursor.executemany("INSERT INTO Snapshot_License (Snapshot_ID, License, Issued, Used, Denied) VALUES (?, ?, ?, ?, ?)",
+                           [(snapshot_id,) + row for row in license_rows])
+        prune_snapshots(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return snapshot_id
+
+def insert_into_database(cursor, conn, license_data, source=SOURCE_LMSTAT):
+    return run_with_retry(write_snapshot, cursor, conn, build_rows(license_data), build_license_rows(license_data), source)
+
+def write_file_atomically(file_path, content):
+    # Readers in other processes only ever see a complete file
+    temp_file = f"{file_path}.{os.getpid()}.tmp"
+    with open(temp_file, "w") as outfile:
+        outfile.write(content)
+    os.replace(temp_file, file_path)
 
 def save_filtered_output(filtered_output_file, license_data):
-    with open(filtered_output_file, "w") as outfile:
-        for lic, data in license_data.items():
-            outfile.write(f"License: {lic}\n")
-            outfile.write(f"  Total Issued: {data['issued']}\n")
-            outfile.write(f"  Total Used: {data['used']}\n")
-            outfile.write("  Users:\n")
-            for user in data["users"]:
-                outfile.write(f"    User: {user['User']}\n")
-                outfile.write(f"    Hostname: {user['Hostname']}\n")
-                outfile.write(f"    Display: {user['Display']}\n")
-                outfile.write(f"    PID: {user['PID']}\n")
-                outfile.write(f"    Version: {user['Version']}\n")
-                outfile.write(f"    Server: {user['Server']}\n")
-                outfile.write(f"    Start Day: {user['Start_day']}\n")
-                outfile.write(f"    Start Date: {user['Start_date']}\n")
-                outfile.write(f"    Start Time: {user['Start_time']}\n")
-                outfile.write("\n")
-
-def main():
+    lines = []
+    for lic, data in license_data.items():
+        lines.append(f"License: {lic}\n")
+        lines.append(f"  Total Issued: {data['issued']}\n")
+        lines.append(f"  Total Used: {data['used']}\n")
+        if "denied" in data:
+            lines.append(f"  Total Denied: {data['denied']}\n")
+        lines.append("  Users:\n")
+        for user in data["users"]:
+            lines.append(f"    User: {user['User']}\n")
+            lines.append(f"    Hostname: {user['Hostname']}\n")
+            lines.append(f"    Display: {user['Display']}\n")
+            lines.append(f"    PID: {user['PID']}\n")
+            lines.append(f"    Version: {user['Version']}\n")
+            lines.append(f"    Server: {user['Server']}\n")
+            lines.append(f"    Start Day: {user['Start_day']}\n")
+            lines.append(f"    Start Date: {user['Start_date']}\n")
+            lines.append(f"    Start Time: {user['Start_time']}\n")
+            lines.append("\n")
+    write_file_atomically(filtered_output_file, "".join(lines))
+
+def main(output_file="./output/output.txt"):
     db_file = "./database/licenses.db"
-    output_file = "./output/output.txt"
     filtered_output_file = "./output/filtered_output.txt"
     
     conn, cursor = setup_database(db_file)
@@ -132,11 +282,12 @@ def main():
         exit(1)
     
     license_data = parse_output_file(output_file, target_licenses)
-    insert_into_database(cursor, conn, license_data)
+    snapshot_id = insert_into_database(cursor, conn, license_data)
     save_filtered_output(filtered_output_file, license_data)
     
     #print("Filtered output has been saved to 'filtered_output.txt'")
     conn.close()
+    return snapshot_id
 
 if __name__ == "__main__":
     main()
@@ -1,18 +1,33 @@
-import sqlite3
 import subprocess
 import os
+import re
+import signal
+import time
+import queue
+import threading
+import filterLicense
 
 DB_FILE = "./database/licenses.db"
 OUTPUT_FOLDER = "./output"
 OUTPUT_FILE = f"{OUTPUT_FOLDER}/output.txt"
 LMUTIL_PATH = r"C:\Program Files\ANSYS Inc\v212\licensingclient\winx64\lmutil.exe"
+HEDGE_DELAY = 2.0           # seconds to wait on one host before also asking the next
+LATENCY_SMOOTHING = 0.3     # weight of the newest sample in the per-host latency average
+LMUTIL_TIMEOUT = 30         # deadline in seconds for a single lmutil call
+KILL_WAIT = 2               # seconds to collect the output of a killed lmutil before giving up on its pipes
+BREAKER_THRESHOLD = 3       # consecutive failures before a host is skipped
+BREAKER_COOLDOWN = 120      # seconds a failing host is skipped before it is tried again
+
+# Per-host latency, failure history and circuit breaker state, kept for the lifetime of the process
+HOST_STATS = {}
+HOST_STATS_LOCK = threading.Lock()
 
 def setup_database():
     """Connects to the SQLite database."""
     if not os.path.exists(DB_FILE):
         print("Database file not found. Please ensure the database exists.")
         exit(1)
-    return sqlite3.connect(DB_FILE)
+    return filterLicense.connect_database(DB_FILE)
 
 def get_active_server(cursor):
     """Retrieves the active server from the database."""
@@ -25,23 +40,146 @@ def ensure_output_directory():
     if not os.path.exists(OUTPUT_FOLDER):
         os.mkdir(OUTPUT_FOLDER)
 
-def run_lmutil_command(active_server):
-    """Runs the lmutil command and captures its output."""
-    command = rf'& "{LMUTIL_PATH}" lmstat -c {active_server} -a'
+def build_lmutil_command(server):
+    """Builds the lmstat command line for the current platform."""
+    if os.name == "nt":
+        return ["powershell.exe", "-Command", rf'& "{LMUTIL_PATH}" lmstat -c {server} -a']
+    return [LMUTIL_PATH, "lmstat", "-c", server, "-a"]
+
+def kill_process_tree(process):
+    """Kills the process and every child it started (PowerShell -> lmutil)."""
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    process.kill()
+
+def run_lmutil_command(active_server, timeout=None, cancel_event=None):
+    """
+    Runs the lmutil command and captures its output. The whole process tree is killed
+    when the deadline passes or cancel_event is set, and (None, -1) is returned.
+    """
+    timeout = LMUTIL_TIMEOUT if timeout is None else timeout
     try:
-        result = subprocess.run(["powershell.exe", "-Command", command], capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        return result.stdout, result.returncode
+        if os.name == "nt":
+            process = subprocess.Popen(build_lmutil_command(active_server), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                       creationflags=subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP)
+        else:
+            process = subprocess.Popen(build_lmutil_command(active_server), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                       start_new_session=True)
     except Exception as e:
         print("Error running the command:", e)
         return None, -1
 
-def save_output_to_file(output):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            stdout, _ = process.communicate(timeout=0.1)
+            return stdout, process.returncode
+        except subprocess.TimeoutExpired:
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            if cancelled or time.monotonic() >= deadline:
+                if not cancelled:
+                    print(f"lmutil did not answer for {active_server} within {timeout} s.")
+                kill_process_tree(process)
+                try:
+                    process.communicate(timeout=KILL_WAIT)
+                except subprocess.TimeoutExpired:
+                    # A child that escaped the kill still holds the pipes open; stop reading instead of waiting on it.
+                    # On Windows communicate's reader threads own the pipes, so they are left to those daemon threads.
+                    if os.name != "nt":
+                        process.stdout.close()
+                        process.stderr.close()
+                return None, -1
+
+def split_server_group(active_server):
+    """Splits a port@host list (a;b) or a triad (a,b,c) into its individual hosts."""
+    return [host.strip() for host in re.split(r"[;,]", active_server) if host.strip()]
+
+def order_hosts(hosts):
+    """Orders hosts so that healthy, fast hosts come first and failing ones last."""
+    def sort_key(host):
+        stats = HOST_STATS.get(host)
+        if stats is None:
+            return (0, float("inf"))
+        return (stats["failures"] > 0, stats["latency"])
+    return sorted(hosts, key=sort_key)
+
+def is_circuit_open(host):
+    """Returns True while a failing host is in its cool-down period."""
+    with HOST_STATS_LOCK:
+        stats = HOST_STATS.get(host)
+        return stats is not None and time.monotonic() < stats.get("open_until", 0)
+
+def record_host_result(host, elapsed, succeeded, cancelled=False):
+    """
+    Updates the latency average and failure count of a host. A cancelled request only
+    tells that the host needed at least `elapsed`, so it raises the latency to that
+    lower bound without counting as a failure.
+    """
+    with HOST_STATS_LOCK:
+        stats = HOST_STATS.setdefault(host, {"latency": elapsed, "failures": 0})
+        if cancelled:
+            stats["latency"] = max(stats["latency"], elapsed)
+        elif succeeded:
+            stats["latency"] += LATENCY_SMOOTHING * (elapsed - stats["latency"])
+            stats["failures"] = 0
+            stats["open_until"] = 0
+        else:
+            stats["failures"] += 1
+            if stats["failures"] >= BREAKER_THRESHOLD:
+                stats["open_until"] = time.monotonic() + BREAKER_COOLDOWN
+
+def query_server_group(active_server):
+    """
+    Sends hedged lmstat requests to the hosts of a server group. The next host is started
+    when the current ones have not answered within HEDGE_DELAY or have failed, and the
+    first successful answer wins; the requests still running are then cancelled.
+    Hosts with an open circuit breaker are skipped.
+    """
+    hosts = [host for host in order_hosts(split_server_group(active_server)) if not is_circuit_open(host)]
+    results = queue.Queue()
+    cancel_event = threading.Event()
+
+    def query_host(host):
+        start = time.monotonic()
+        output, return_code = run_lmutil_command(host, cancel_event=cancel_event)
+        succeeded = output is not None and return_code == 0
+        cancelled = not succeeded and cancel_event.is_set()
+        record_host_result(host, time.monotonic() - start, succeeded, cancelled)
+        results.put((output, return_code, succeeded))
+
+    next_host = 0
+    pending = 0
+    last_result = (None, -1)
+    while next_host < len(hosts) or pending:
+        if next_host < len(hosts):
+            threading.Thread(target=query_host, args=(hosts[next_host],), daemon=True).start()
+            next_host += 1
+            pending += 1
+        try:
+            output, return_code, succeeded = results.get(timeout=HEDGE_DELAY if next_host < len(hosts) else None)
+        except queue.Empty:
+            continue  # Latency budget spent, hedge onto the next host
+        pending -= 1
+        if succeeded:
+            cancel_event.set()
+            return output, return_code
+        last_result = (output, return_code)
+    return last_result
+
+def save_output_to_file(output, output_file=OUTPUT_FILE):
     """Writes command output to a file."""
-    with open(OUTPUT_FILE, "w") as file:
-        file.write(output)
+    filterLicense.write_file_atomically(output_file, output)
 
-def main():
-    """Main function to coordinate execution."""
+def main(output_file=OUTPUT_FILE):
+    """
+    Main function to coordinate execution. Returns True when fresh output was written to
+    output_file, or False when the servers failed and the last good output was kept (stale data).
+    """
     conn = setup_database()
     cursor = conn.cursor()
 
@@ -52,14 +190,17 @@ def main():
         exit(1)
 
     ensure_output_directory()
-    output, return_code = run_lmutil_command(active_server)
-
-    if output is not None:
-        save_output_to_file(output)
-        #print("Return Code:", return_code)
-        #print(f"Output written to {OUTPUT_FILE}")
+    output, return_code = query_server_group(active_server)
 
     conn.close()
+    if output is None or return_code != 0:
+        print(f"No answer from {active_server}, keeping the last good output.")
+        return False
+
+    save_output_to_file(output, output_file)
+    #print("Return Code:", return_code)
+    #print(f"Output written to {OUTPUT_FILE}")
+    return True
 
 if __name__ == "__main__":
     main()
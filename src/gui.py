@@ -4,9 +4,15 @@ from tkinter import ttk, messagebox
 from ttkbootstrap import Style
 import subprocess
 import os
+import atexit
 from datetime import datetime
 import filterLicense
 import getLicenseStatus
+import tailDebugLog
+
+LIVE_FEED_POLL_INTERVAL = 5000   # milliseconds between checks for a new live feed snapshot
+# The tailer republishes at least on every reconciliation, so an older live snapshot means it has stopped
+LIVE_FEED_MAX_AGE = 2 * tailDebugLog.RECONCILE_INTERVAL
 
 
 class Database:
@@ -25,7 +31,7 @@ class Database:
         if not os.path.exists(self.folderPath):
             os.mkdir(self.folderPath)
 
-        self.conn = sqlite3.connect(self.db_file)
+        self.conn = filterLicense.connect_database(self.db_file)
         self.cursor = self.conn.cursor()
 
         # Create tables if they don't exist
@@ -52,6 +58,9 @@ class Database:
 
         self.conn.commit()
 
+        # Snapshot tables are read before the first refresh writes to them
+        filterLicense.ensure_snapshot_tables(self.conn, self.db_file)
+
     def execute_query(self, query, params=None):
         """Executes a SQL query and returns the fetched results."""
         if params:
@@ -79,11 +88,21 @@ class LicenseMonitorApp:
         self.style = Style("darkly")
         self.setup_gui()
         self.setup_scripts()
+        self.root.after(LIVE_FEED_POLL_INTERVAL, self.poll_live_feed)
 
     def setup_scripts(self):
-        """Configures output directories and paths for filtered results."""
+        """Configures the output path for this instance's lmstat results."""
         self.folderOutput = "./output"
-        self.FILTERED_OUTPUT_FILE = f"{self.folderOutput}/filtered_output.txt"
+        # Per-process lmstat output, so another instance cannot swap it between fetching and filtering
+        self.OUTPUT_FILE = f"{self.folderOutput}/output_{os.getpid()}.txt"
+        self.snapshot_id = None  # Snapshot written by this instance's last refresh
+        self.displayed_snapshot_id = None
+        atexit.register(self.remove_output_file)
+
+    def remove_output_file(self):
+        """Deletes this instance's lmstat output when the application exits."""
+        if os.path.exists(self.OUTPUT_FILE):
+            os.remove(self.OUTPUT_FILE)
 
     def setup_gui(self):
         """Configures GUI styles, creates frames, and sets up interface components."""
@@ -146,39 +165,37 @@ class LicenseMonitorApp:
 
     def copy_license_to_clipboard(self, event, treeview):
         """
-        Copies the formatted license information to the clipboard for the selected active user.
+        Copies the formatted license information to the clipboard for the clicked checkout.
         """
-        conn = sqlite3.connect('./database/licenses.db') 
-        cursor = conn.cursor()  # Create a cursor object to interact with the database
-
         # Identify the row where the user clicked
         item = treeview.identify_row(event.y)
 
         if not item:
-            self.messagebox.showerror("Error", "No item selected.")
+            messagebox.showerror("Error", "No item selected.")
             return
 
-        # Retrieve the item values
-        values = treeview.item(item, "values")
-        if len(values) < 2:
-            self.messagebox.showerror("Error", "Invalid selection.")
+        # User rows carry the Row_ID of their checkout, license rows carry none
+        if not item.startswith("row-"):
+            messagebox.showerror("Error", "Invalid selection.")
             return
 
-        user_name, license_name = values[0], values[1]
+        conn = filterLicense.connect_database('./database/licenses.db')
+        cursor = conn.cursor()  # Create a cursor object to interact with the database
 
         # Query database
         cursor.execute("""
-            SELECT User, Hostname, Display, PID, Version, Server, Start_day, Start_date, Start_time
+            SELECT License, User, Hostname, Display, PID, Version, Server, Start_day, Start_date, Start_time
             FROM temp_data
-            WHERE User = ? AND License = ?
-        """, (user_name, license_name))
+            WHERE Row_ID = ?
+        """, (int(item[len("row-"):]),))
 
         user_data = cursor.fetchone()
+        conn.close()
 
         if user_data:
             formatted_text = (
-                f"\n{license_name} {user_data[0]} {user_data[1]} {user_data[2]} {user_data[3]} "
-                f"({user_data[4]}) ({user_data[5]}), {user_data[6]} {user_data[7]} {user_data[8]}"
+                f"\n{user_data[0]} {user_data[1]} {user_data[2]} {user_data[3]} {user_data[4]} "
+                f"({user_data[5]}) ({user_data[6]}), {user_data[7]} {user_data[8]} {user_data[9]}"
             )
 
             # Copy to clipboard
@@ -188,9 +205,7 @@ class LicenseMonitorApp:
 
             #print(f"Copied to clipboard: {formatted_text}")  # Debugging purpose    
         else:
-            self.messagebox.showerror("Error", "No data found for the selected user/license.")
-        
-        conn.close()
+            messagebox.showerror("Error", "No data found for the selected user/license. Please refresh.")
 
     def setup_license_tables(self):
         """Set-up dashboard for licenses - User, Available and Fully"""
@@ -318,36 +333,66 @@ class LicenseMonitorApp:
     def run_refresh_sequence(self):
         """Runs external scripts to refresh license data."""
         try:
+            # While the debug log tailer keeps a live feed, it replaces the lmstat run
+            if self.show_live_feed():
+                return
+
             # Run the first script function
             try:
-                getLicenseStatus.main()
+                is_fresh = getLicenseStatus.main(self.OUTPUT_FILE)
             except Exception as e:
-                messagebox.showerror("Error", f"Error running '{self.GET_LICENSE_SCRIPT}':\n{e}")
+                messagebox.showerror("Error", f"Error running 'getLicenseStatus':\n{e}")
+                return
+
+            if not is_fresh and not os.path.exists(self.OUTPUT_FILE):
+                messagebox.showerror("Error", "License server unreachable and no earlier data is available.")
                 return
 
             # Run the second script function
             try:
-                filterLicense.main()
+                self.snapshot_id = filterLicense.main(self.OUTPUT_FILE)
             except Exception as e:
-                messagebox.showerror("Error", f"Error running '{self.FILTER_LICENSE_SCRIPT}':\n{e}")
+                messagebox.showerror("Error", f"Error running 'filterLicense':\n{e}")
                 return
 
             # Continue with the refresh sequence
             self.display_filtered_output()
-            self.update_timestamp()
+            self.update_timestamp(is_fresh)
 
         except Exception as e:
             messagebox.showerror("Error", f"Unexpected failure during refresh: {e}")
 
+    def latest_live_snapshot(self):
+        """Returns (Snapshot_ID, Created) of the tailer's newest snapshot, or None if no tailer is running."""
+        return filterLicense.latest_source_snapshot(self.db.cursor, filterLicense.SOURCE_DEBUG_LOG, LIVE_FEED_MAX_AGE)
+
+    def show_live_feed(self):
+        """Displays the live feed if the tailer is running. Returns True if it did."""
+        live_snapshot = self.latest_live_snapshot()
+        if live_snapshot is None:
+            return False
+        snapshot_id, created = live_snapshot
+        if snapshot_id != self.displayed_snapshot_id:
+            self.display_filtered_output()
+        self.update_timestamp(live_created=created)
+        return True
+
+    def poll_live_feed(self):
+        """Re-reads the live feed on a timer, so checkouts show up without pressing Refresh."""
+        try:
+            self.show_live_feed()
+        except sqlite3.Error as e:
+            print(f"Could not read the live feed: {e}")
+        finally:
+            self.root.after(LIVE_FEED_POLL_INTERVAL, self.poll_live_feed)
+
     def display_filtered_output(self):
-        """Displays parsed license data in UI tables."""
-        if not os.path.exists(self.FILTERED_OUTPUT_FILE):
-            messagebox.showerror("Error", "Filtered output file not found. Please try refreshing.")
+        """Displays the license data of the current snapshot in UI tables."""
+        license_data = self.load_snapshot_data()
+        if license_data is None:
+            messagebox.showerror("Error", "No license data found. Please try refreshing.")
             return
     
-        with open(self.FILTERED_OUTPUT_FILE, "r") as file:
-            output_content = file.readlines()
-    
         for item in self.available_tree.get_children():
             self.available_tree.delete(item)
         for item in self.full_tree.get_children():
@@ -355,7 +400,6 @@ class LicenseMonitorApp:
         for item in self.user_tree.get_children():
             self.user_tree.delete(item)
     
-        license_data = self.parse_filtered_output(output_content)
         active_users = self.get_active_users()
     
         for lic, data in license_data.items():
@@ -364,69 +408,81 @@ class LicenseMonitorApp:
             status = "Available" if used < issued else "Fully Used"
             color_tag = "green" if used < issued else "red"
             target_tree = self.available_tree if status == "Available" else self.full_tree
-            parent = target_tree.insert("", "end", values=(lic, f"{used}/{issued}", status), tags=(color_tag,))
+            status_text = f"{status} ({data['denied']} denied)" if data["denied"] else status
+            parent = target_tree.insert("", "end", values=(lic, f"{used}/{issued}", status_text), tags=(color_tag,))
 
             # Display users associated with each license in the user tree
             for user in data["users"]:
-                target_tree.insert(parent, "end", values=(user["User"], f"{user['Start_day']} {user['Start_date']} {user['Start_time']}", user["Duration_Hours"]))
+                row_iid = f"row-{user['Row_ID']}"
+                target_tree.insert(parent, "end", iid=row_iid, values=(user["User"], f"{user['Start_day']} {user['Start_date']} {user['Start_time']}", user["Duration_Hours"]))
                 if user["User"] in active_users:
-                    self.user_tree.insert("", "end", values=(user["User"], lic))  # Display user license
+                    self.user_tree.insert("", "end", iid=row_iid, values=(user["User"], lic))  # Display user license
     
         self.available_tree.tag_configure("green", foreground="green")
         self.full_tree.tag_configure("red", foreground="red")
     
     
-    def parse_filtered_output(self, lines):
-        """Parse the filtered data."""
-        license_data = {}
-        current_license = None
-        conn = sqlite3.connect('./database/licenses.db') 
+    def load_snapshot_data(self):
+        """Loads license counts and users of the current snapshot, or None if there is no snapshot yet."""
+        conn = filterLicense.connect_database('./database/licenses.db')
         cursor = conn.cursor()  # Create a cursor object to interact with the database
+        snapshot_id = self.current_snapshot_id(cursor)
+        if snapshot_id is None:
+            conn.close()
+            return None
+        self.displayed_snapshot_id = snapshot_id
 
-        licenses_in_output = set()
-
-        for line in lines:
-            line = line.strip()
-            if line.startswith("License:"):
-                parts = line.split(": ")
-                if len(parts) == 2:
-                    current_license = parts[1]
-                    licenses_in_output.add(current_license)
-                    if current_license not in license_data:
-                        license_data[current_license] = {"issued": 0, "used": 0, "users": []}
-            elif "Total Issued:" in line:
-                license_data[current_license]["issued"] = int(line.split(": ")[1])
-            elif "Total Used:" in line:
-                license_data[current_license]["used"] = int(line.split(": ")[1])
-
-        # Query for users per license
-        # Fetch the users for this license
-        
-        for lic in licenses_in_output:
-            cursor.execute("""
-                SELECT User, Start_day, Start_date, Start_time, Duration_Hours 
-                FROM temp_data WHERE License = ?
-            """, (lic,))
-            users = cursor.fetchall()
+        # Counts and users come from the same snapshot, written in one transaction
+        license_data = {}
+        cursor.execute("SELECT License, Issued, Used, Denied FROM Snapshot_License WHERE Snapshot_ID = ? ORDER BY License", (snapshot_id,))
+        for lic, issued, used, denied in cursor.fetchall():
+            license_data[lic] = {"issued": issued, "used": used, "denied": denied, "users": []}
+
+        # Fetch the users of all licenses in one query; idx_temp_data_snapshot serves it in this order without sorting
+        cursor.execute("""
+            SELECT Row_ID, License, User, Start_day, Start_date, Start_time, Duration_Hours
+            FROM temp_data WHERE Snapshot_ID = ?
+            ORDER BY License, User
+        """, (snapshot_id,))
         # Append the user information
-            for user in users:
-                user_info = {
-                    "User": user[0],
-                    "Start_day": user[1],
-                    "Start_date": user[2],
-                    "Start_time": user[3],
-                    "Duration_Hours": user[4]
-                }
-                license_data[lic]["users"].append(user_info)  # Append the user info to the license
+        for user in cursor.fetchall():
+            user_info = {
+                "Row_ID": user[0],
+                "User": user[2],
+                "Start_day": user[3],
+                "Start_date": user[4],
+                "Start_time": user[5],
+                "Duration_Hours": user[6]
+            }
+            license_data[user[1]]["users"].append(user_info)  # Append the user info to the license
         conn.close()  # close the connection after done
         return license_data
 
+    def current_snapshot_id(self, cursor):
+        """
+        Returns the tailer's newest snapshot while the live feed runs, otherwise this
+        instance's snapshot, or the latest one if it has not refreshed yet.
+        """
+        live_snapshot = filterLicense.latest_source_snapshot(cursor, filterLicense.SOURCE_DEBUG_LOG, LIVE_FEED_MAX_AGE)
+        if live_snapshot is not None:
+            return live_snapshot[0]
+        if self.snapshot_id is not None:
+            return self.snapshot_id
+        return filterLicense.latest_snapshot_id(cursor)
+
     def get_active_users(self):
         return [row[0] for row in self.db.execute_query("SELECT UserName FROM User WHERE Status = 'Active'")]
 
-    def update_timestamp(self):
-        """Updates the last refresh timestamp label."""
-        self.timestamp_label.config(text=f"Last Refreshed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    def update_timestamp(self, is_fresh=True, live_created=None):
+        """Updates the last refresh timestamp label, marking data kept from an earlier refresh as stale."""
+        if live_created is not None:
+            self.timestamp_label.config(text=f"Live from debug log, last updated: {live_created}")
+            return
+        text = f"Last Refreshed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        if not is_fresh and os.path.exists(self.OUTPUT_FILE):
+            data_time = datetime.fromtimestamp(os.path.getmtime(self.OUTPUT_FILE))
+            text += f"  (STALE - server unreachable, data from {data_time.strftime('%Y-%m-%d %H:%M:%S')})"
+        self.timestamp_label.config(text=text)
 
     def add_user(self):
         """Adds a new user to the database."""
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+DEFAULT_CONFIG = {
+    "features": {"aa_r": 10, "aa_r_hpc": 32, "cfd_base": 5, "mech_2": 4},
+    "users": ["jdoe", "asmith", "bwayne", "ckent", "dprince", "pparker"],
+    "churn": 0.2,          # probability per feature and call that seats are checked out or in
+    "latency": 0.05,       # seconds before the answer is printed
+    "failure_rate": 0.0,   # probability that the call fails like an unreachable server
+    "hang_rate": 0.0,      # probability that the call hangs forever, holding a child process like PowerShell does
+    "hang_escapes": False, # the hanging child leaves the process group, so killing the tree misses it
+    "state_file": "./emulator_state.json",
+    "pid_file": None,      # optional file that records the PID of every call and of hanging children
+}
+
+
+def load_config(config_file):
+    """Loads the emulator configuration, falling back to DEFAULT_CONFIG for missing keys."""
+    config = dict(DEFAULT_CONFIG)
+    if config_file:
+        with open(config_file, "r") as file:
+            config.update(json.load(file))
+    return config
+
+
+def load_checkouts(config):
+    """Loads the seats checked out by earlier calls."""
+    if os.path.exists(config["state_file"]):
+        try:
+            with open(config["state_file"], "r") as file:
+                return json.load(file)
+        except (ValueError, OSError):
+            pass
+    return {feature: [] for feature in config["features"]}
+
+
+def save_checkouts(config, checkouts):
+    """Saves the checked out seats for the next call."""
+    temp_file = f"{config['state_file']}.{os.getpid()}.tmp"
+    with open(temp_file, "w") as file:
+        json.dump(checkouts, file)
+    os.replace(temp_file, config["state_file"])
+
+
+def churn_checkouts(config, checkouts):
+    """Randomly checks seats out and in, never exceeding the issued count."""
+    now = datetime.now()
+    for feature, issued in config["features"].items():
+        seats = checkouts.setdefault(feature, [])
+        if random.random() >= config["churn"]:
+            continue
+        if seats and (len(seats) >= issued or random.random() < 0.5):
+            seats.pop(random.randrange(len(seats)))
+        else:
+            user = random.choice(config["users"])
+            seats.append({
+                "User": user,
+                "Hostname": f"WS-{user.upper()}",
+                "PID": random.randint(1000, 65000),
+                "Start": now.strftime("%a %m/%d %H:%M"),
+            })
+    return checkouts
+
+
+def format_lmstat(config, server, checkouts):
+    """Formats the checkouts the way `lmutil lmstat -a` prints them."""
+    host = server.split("@")[-1]
+    lines = [
+        "lmutil - Copyright (c) 1989-2019 Flexera. All Rights Reserved.",
+        f"Flexible License Manager status on {datetime.now().strftime('%a %m/%d/%Y %H:%M')}",
+        "",
+        f"License server status: {server}",
+        f"    License file(s) on {host}: C:\\Program Files\\ANSYS Inc\\Shared Files\\Licensing\\license.dat:",
+        "",
+        f"{host}: license server UP (MASTER) v11.16.4",
+        "",
+        f"Vendor daemon status (on {host}):",
+        "",
+        "  ansyslmd: UP v11.16.4",
+        "",
+        "Feature usage info:",
+        "",
+    ]
+    for feature, issued in config["features"].items():
+        seats = checkouts.get(feature, [])
+        lines.append(f"Users of {feature}:  (Total of {issued} licenses issued;  Total of {len(seats)} licenses in use)")
+        lines.append("")
+        lines.append(f'  "{feature}" v9999.9999, vendor: ansyslmd, expiry: 31-dec-2099')
+        lines.append("  floating license")
+        lines.append("")
+        for seat in seats:
+            lines.append(f"    {seat['User']} {seat['Hostname']} {seat['Hostname']} {seat['PID']} (v2021.0506) ({server.replace('@', '/')} 101), start {seat['Start']}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def record_pid(config, kind, pid):
+    """Appends a "<kind> <pid>" line to the pid file, if one is configured."""
+    if config["pid_file"]:
+        with open(config["pid_file"], "a") as file:
+            file.write(f"{kind} {pid}\n")
+
+
+def hang(config):
+    """Starts a child that never exits and then waits forever, like a hung lmutil under PowerShell."""
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(86400)"], start_new_session=config["hang_escapes"])
+    record_pid(config, "child", child.pid)
+    while True:
+        time.sleep(60)
+
+
+def main():
+    """Emulates `lmutil lmstat -c <server> -a` with changing license usage."""
+    parser = argparse.ArgumentParser(description="Fake lmutil that prints changing lmstat -a output.")
+    parser.add_argument("--config", help="JSON file overriding DEFAULT_CONFIG")
+    # Everything else is an lmutil argument, e.g. lmstat -c 1055@host -a
+    args, command = parser.parse_known_args()
+
+    config = load_config(args.config)
+    server = "1055@localhost"
+    if "-c" in command and command.index("-c") + 1 < len(command):
+        server = command[command.index("-c") + 1]
+
+    record_pid(config, "call", os.getpid())
+    time.sleep(config["latency"])
+    if random.random() < config["hang_rate"]:
+        hang(config)
+    if random.random() < config["failure_rate"]:
+        print("lmgrd is not running: License server machine is down or not responding. (-96,7)")
+        sys.exit(1)
+
+    checkouts = churn_checkouts(config, load_checkouts(config))
+    save_checkouts(config, checkouts)
+    sys.stdout.write(format_lmstat(config, server, checkouts))
+
+
+if __name__ == "__main__":
+    main()
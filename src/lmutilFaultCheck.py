@@ -0,0 +1,165 @@
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import getLicenseStatus
+import soakHarness
+
+DEADLINE = 1.0
+COOLDOWN = 1.5
+
+
+def process_alive(pid):
+    """Returns True if the process still runs; zombies waiting to be reaped count as gone."""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    if os.path.exists(f"/proc/{pid}/stat"):
+        with open(f"/proc/{pid}/stat", "r") as file:
+            return file.read().rsplit(")", 1)[1].split()[0] != "Z"
+    return True
+
+
+def read_pids(pid_file, kind):
+    if not os.path.exists(pid_file):
+        return []
+    with open(pid_file, "r") as file:
+        return [int(line.split()[1]) for line in file if line.startswith(kind)]
+
+
+def kill_recorded(pid_file):
+    """Kills every process the emulator recorded, so a hanging check fails instead of hanging."""
+    for pid in read_pids(pid_file, "call") + read_pids(pid_file, "child"):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def timed_lmutil_call(pid_file, limit):
+    """Runs one lmutil call with a watchdog that kills the emulator after `limit` seconds. Returns (result, elapsed)."""
+    watchdog = threading.Timer(limit, kill_recorded, args=(pid_file,))
+    watchdog.daemon = True
+    watchdog.start()
+    start = time.monotonic()
+    result = getLicenseStatus.run_lmutil_command(soakHarness.EMULATOR_SERVER)
+    elapsed = time.monotonic() - start
+    watchdog.cancel()
+    return result, elapsed
+
+
+def configure(workdir, pid_file, failure_rate=0.0, hang_rate=0.0, hang_escapes=False):
+    """Points getLicenseStatus at the emulator with the given fault rates."""
+    getLicenseStatus.LMUTIL_PATH = soakHarness.write_emulator_shim(workdir, {
+        "features": {"aa_r": 4},
+        "latency": 0.0,
+        "failure_rate": failure_rate,
+        "hang_rate": hang_rate,
+        "hang_escapes": hang_escapes,
+        "state_file": os.path.join(workdir, "emulator_state.json"),
+        "pid_file": pid_file,
+    })
+
+
+def main():
+    """Checks the lmutil deadline, process-tree kill and circuit breaker against the emulator."""
+    if os.name == "nt":
+        print("This check relies on POSIX process groups; run it on Linux or macOS.")
+        return 0
+
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'ok  ' if condition else 'FAIL'} {name} {detail}")
+        if not condition:
+            failures.append(name)
+
+    workdir = tempfile.mkdtemp(prefix="lmutil_fault_")
+    soakHarness.setup_workdir(workdir, ["aa_r"], [])
+    os.chdir(workdir)
+    pid_file = os.path.join(workdir, "pids.txt")
+    output_file = "./output/output.txt"
+    getLicenseStatus.LMUTIL_TIMEOUT = DEADLINE
+    getLicenseStatus.BREAKER_COOLDOWN = COOLDOWN
+
+    # 1. A hanging lmutil is killed at the deadline, together with its child
+    configure(workdir, pid_file, hang_rate=1.0)
+    result, elapsed = timed_lmutil_call(pid_file, DEADLINE + 5.0)
+    check("deadline returns no output", result == (None, -1), str(result))
+    check("deadline is kept", elapsed < DEADLINE + 1.0, f"({elapsed:.2f} s)")
+    time.sleep(0.5)
+    spawned = read_pids(pid_file, "call") + read_pids(pid_file, "child")
+    alive = [pid for pid in spawned if process_alive(pid)]
+    check("whole process tree killed", len(spawned) == 2 and not alive, f"(spawned {spawned}, alive {alive})")
+    for pid in alive:
+        os.kill(pid, signal.SIGKILL)
+    if alive:
+        print("Hanging processes were left behind, skipping the breaker checks.")
+        return 1
+
+    # A child that escapes the process group keeps the pipes open; the call still ends after KILL_WAIT
+    os.remove(pid_file)
+    configure(workdir, pid_file, hang_rate=1.0, hang_escapes=True)
+    limit = DEADLINE + getLicenseStatus.KILL_WAIT
+    result, elapsed = timed_lmutil_call(pid_file, limit + 5.0)
+    check("escaped child returns no output", result == (None, -1), str(result))
+    check("escaped child does not block", elapsed < limit + 1.0, f"({elapsed:.2f} s)")
+    kill_recorded(pid_file)
+
+    # 2. The breaker opens after BREAKER_THRESHOLD failures and the last good output is kept
+    getLicenseStatus.HOST_STATS.clear()
+    os.remove(pid_file)
+    configure(workdir, pid_file)
+    check("healthy refresh is fresh", getLicenseStatus.main(output_file) is True)
+    with open(output_file, "r") as file:
+        last_good = file.read()
+
+    configure(workdir, pid_file, failure_rate=1.0)
+    calls_before = len(read_pids(pid_file, "call"))
+    for _ in range(getLicenseStatus.BREAKER_THRESHOLD):
+        check("failing refresh is stale", getLicenseStatus.main(output_file) is False)
+    check("each failure called lmutil", len(read_pids(pid_file, "call")) - calls_before == getLicenseStatus.BREAKER_THRESHOLD)
+    check("breaker open", getLicenseStatus.is_circuit_open(soakHarness.EMULATOR_SERVER))
+
+    calls_before = len(read_pids(pid_file, "call"))
+    start = time.monotonic()
+    check("open breaker serves stale data", getLicenseStatus.main(output_file) is False)
+    check("open breaker skips lmutil", len(read_pids(pid_file, "call")) == calls_before and time.monotonic() - start < 0.5)
+    with open(output_file, "r") as file:
+        check("last good output kept", file.read() == last_good)
+
+    # 3. After the cool-down one half-open attempt is made; a failure reopens the breaker at once
+    time.sleep(COOLDOWN + 0.1)
+    check("breaker half-open after cool-down", not getLicenseStatus.is_circuit_open(soakHarness.EMULATOR_SERVER))
+    calls_before = len(read_pids(pid_file, "call"))
+    getLicenseStatus.main(output_file)
+    check("half-open makes one attempt", len(read_pids(pid_file, "call")) - calls_before == 1)
+    check("failed half-open attempt reopens", getLicenseStatus.is_circuit_open(soakHarness.EMULATOR_SERVER))
+
+    time.sleep(COOLDOWN + 0.1)
+    configure(workdir, pid_file)
+    check("successful half-open attempt is fresh", getLicenseStatus.main(output_file) is True)
+    check("breaker closed again", not getLicenseStatus.is_circuit_open(soakHarness.EMULATOR_SERVER)
+          and getLicenseStatus.HOST_STATS[soakHarness.EMULATOR_SERVER]["failures"] == 0)
+
+    if failures:
+        print(f"{len(failures)} checks failed.")
+        return 1
+    print("lmutil fault handling OK.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
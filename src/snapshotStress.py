@@ -0,0 +1,91 @@
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import filterLicense
+import lmutilEmulator
+import soakHarness
+
+FEATURES = {"aa_r": 12, "anshpc": 40, "cfd_base": 6}
+
+
+def expected_usage(worker):
+    """Returns the seats each worker reports per feature; every worker has its own users and counts."""
+    return {feature: (worker * 3 + index) % (seats + 1) for index, (feature, seats) in enumerate(FEATURES.items())}
+
+
+def run_worker(args):
+    """Runs filterLicense.main repeatedly on this worker's own lmstat output. Returns (worker, snapshot ids)."""
+    workdir, worker, calls = args
+    os.chdir(workdir)
+    checkouts = {
+        feature: [{"User": f"w{worker}_{seat}", "Hostname": f"WS{worker}", "PID": 1000 + seat, "Start": "Mon 10/19 9:00"} for seat in range(used)]
+        for feature, used in expected_usage(worker).items()
+    }
+    output_file = f"./output/stress_{worker}.txt"
+    with open(output_file, "w") as file:
+        file.write(lmutilEmulator.format_lmstat({"features": FEATURES}, "1055@stress", checkouts))
+    return worker, [filterLicense.main(output_file) for _ in range(calls)]
+
+
+def check_snapshots(results):
+    """Checks that every snapshot id is unique and holds exactly its writer's rows and counts."""
+    failures = []
+    all_ids = [snapshot_id for _, ids in results for snapshot_id in ids]
+    if len(all_ids) != len(set(all_ids)):
+        failures.append(f"{len(all_ids) - len(set(all_ids))} duplicate snapshot ids")
+
+    conn = sqlite3.connect("./database/licenses.db")
+    cursor = conn.cursor()
+    for worker, ids in results:
+        expected = expected_usage(worker)
+        for snapshot_id in ids:
+            cursor.execute("SELECT License, User FROM temp_data WHERE Snapshot_ID = ?", (snapshot_id,))
+            rows = cursor.fetchall()
+            counts = {feature: 0 for feature in FEATURES}
+            for lic, user in rows:
+                counts[lic] += 1
+                if not user.startswith(f"w{worker}_"):
+                    failures.append(f"snapshot {snapshot_id} of worker {worker} holds a row of {user}")
+            if counts != expected:
+                failures.append(f"snapshot {snapshot_id} of worker {worker}: rows {counts}, expected {expected}")
+
+            cursor.execute("SELECT License, Issued, Used FROM Snapshot_License WHERE Snapshot_ID = ?", (snapshot_id,))
+            totals = {lic: (issued, used) for lic, issued, used in cursor.fetchall()}
+            expected_totals = {feature: (FEATURES[feature], used) for feature, used in expected.items()}
+            if totals != expected_totals:
+                failures.append(f"snapshot {snapshot_id} of worker {worker}: counts {totals}, expected {expected_totals}")
+    conn.close()
+    return failures
+
+
+def main():
+    """Runs many concurrent refresh processes against one licenses.db and checks for lost or mixed rows."""
+    parser = argparse.ArgumentParser(description="Concurrent snapshot stress test for licenses.db.")
+    parser.add_argument("--processes", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=30, help="filterLicense.main calls per process")
+    parser.add_argument("--workdir", help="defaults to a new temporary folder")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="snapshot_stress_"))
+    soakHarness.setup_workdir(workdir, list(FEATURES), [])
+    os.chdir(workdir)
+    print(f"{args.processes} processes x {args.calls} refreshes against {workdir}/database/licenses.db")
+
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(run_worker, [(workdir, worker, args.calls) for worker in range(args.processes)])
+
+    failures = check_snapshots(results)
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    if failures:
+        print(f"{len(failures)} problems found.")
+        return 1
+    print(f"{sum(len(ids) for _, ids in results)} snapshots checked, no lost or mixed rows.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
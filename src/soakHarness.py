@@ -0,0 +1,272 @@
+import argparse
+import csv
+import gc
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import filterLicense
+import getLicenseStatus
+
+EMULATOR_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lmutilEmulator.py")
+EMULATOR_SERVER = "1055@emulator"
+
+
+def setup_workdir(workdir, features, users):
+    """Creates the database and output folders the scripts expect and fills in licenses, server and users."""
+    os.makedirs(os.path.join(workdir, "database"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "output"), exist_ok=True)
+    conn = sqlite3.connect(os.path.join(workdir, "database", "licenses.db"))
+    conn.execute("CREATE TABLE IF NOT EXISTS License (License TEXT PRIMARY KEY, Name TEXT NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS Server (Server TEXT PRIMARY KEY, Status TEXT NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS User (UserName TEXT PRIMARY KEY, Status TEXT NOT NULL)")
+    conn.executemany("INSERT OR REPLACE INTO License (License, Name) VALUES (?, ?)", [(feature, feature) for feature in features])
+    conn.execute("INSERT OR REPLACE INTO Server (Server, Status) VALUES (?, 'Active')", (EMULATOR_SERVER,))
+    conn.executemany("INSERT OR REPLACE INTO User (UserName, Status) VALUES (?, 'Active')", [(user,) for user in users[:2]])
+    conn.commit()
+    conn.close()
+
+
+def write_emulator_shim(workdir, config):
+    """Writes the emulator config and an executable wrapper that stands in for lmutil."""
+    config_file = os.path.join(workdir, "emulator_config.json")
+    with open(config_file, "w") as file:
+        json.dump(config, file)
+
+    if os.name == "nt":
+        shim = os.path.join(workdir, "lmutil.cmd")
+        with open(shim, "w") as file:
+            file.write(f'@"{sys.executable}" "{EMULATOR_SCRIPT}" --config "{config_file}" %*\n')
+    else:
+        shim = os.path.join(workdir, "lmutil")
+        with open(shim, "w") as file:
+            file.write(f'#!/bin/sh\nexec "{sys.executable}" "{EMULATOR_SCRIPT}" --config "{config_file}" "$@"\n')
+        os.chmod(shim, 0o755)
+    return shim
+
+
+class MessageCounter:
+    """Stands in for tkinter.messagebox, so error dialogs are counted instead of blocking the run."""
+
+    def __init__(self):
+        self.errors = []
+
+    def showerror(self, title, message):
+        self.errors.append(message)
+
+
+def start_gui():
+    """
+    Creates a hidden GUI instance, starting a virtual display when none is available.
+    Returns (root, app, display); all None when no display can be had.
+    """
+    display = None
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        try:
+            from pyvirtualdisplay import Display
+        except ImportError:
+            print("No DISPLAY and pyvirtualdisplay is not installed.")
+            return None, None, None
+        try:
+            display = Display(visible=False, size=(1024, 768))
+            display.start()
+        except Exception as e:
+            print(f"Could not start a virtual display: {e}")
+            return None, None, None
+
+    import tkinter as tk
+    import gui
+    gui.messagebox = MessageCounter()
+    root = tk.Tk()
+    root.withdraw()
+    app = gui.LicenseMonitorApp(root, gui.Database())
+    return root, app, display
+
+
+def count_open_files():
+    """Returns the number of open file descriptors/handles of this process, or None if unknown."""
+    if os.path.isdir("/proc/self/fd"):
+        return len(os.listdir("/proc/self/fd"))
+    try:
+        import psutil
+    except ImportError:
+        return None
+    process = psutil.Process()
+    return process.num_handles() if os.name == "nt" else process.num_fds()
+
+
+def count_sqlite_connections():
+    """Returns the number of sqlite3 connections still alive in this process."""
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, sqlite3.Connection))
+
+
+def database_size():
+    """Returns the size of licenses.db including its WAL file, in bytes."""
+    return sum(os.path.getsize(path) for path in (getLicenseStatus.DB_FILE, f"{getLicenseStatus.DB_FILE}-wal") if os.path.exists(path))
+
+
+def run_cycle(root, app):
+    """Runs one refresh, through the GUI's own refresh sequence when it is running. Returns (fresh, error)."""
+    if app is None:
+        try:
+            fresh = getLicenseStatus.main()
+            filterLicense.main()
+            return fresh, None
+        except (Exception, SystemExit) as e:
+            return False, repr(e)
+
+    import gui
+    errors_before = len(gui.messagebox.errors)
+    try:
+        app.run_refresh_sequence()
+        root.update()
+    except (Exception, SystemExit) as e:
+        return False, repr(e)
+    if len(gui.messagebox.errors) > errors_before:
+        return False, gui.messagebox.errors[-1]
+    return "STALE" not in app.timestamp_label.cget("text"), None
+
+
+def summarize_window(samples):
+    """Summarizes the metrics of a window of cycles."""
+    latencies = sorted(sample["latency"] for sample in samples)
+    last = samples[-1]
+    return {
+        "median_latency": statistics.median(latencies),
+        "p95_latency": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "db_size": last["db_size"],
+        "open_files": last["open_files"],
+        "connections": last["connections"],
+        "traced_memory": last["traced_memory"],
+    }
+
+
+def print_window(cycle, window):
+    open_files = "n/a" if window["open_files"] is None else window["open_files"]
+    print(f"cycle {cycle:6d}: median {window['median_latency'] * 1000:7.1f} ms, p95 {window['p95_latency'] * 1000:7.1f} ms, "
+          f"db {window['db_size'] / 1024:8.1f} KB, files {open_files}, connections {window['connections']}, "
+          f"traced {window['traced_memory'] / 1024 / 1024:6.2f} MB")
+
+
+def find_regressions(first, last, args):
+    """Compares the first and last windows and returns a list of detected leaks/slowdowns."""
+    problems = []
+    if last["median_latency"] > first["median_latency"] * args.max_latency_growth:
+        problems.append(f"median latency grew from {first['median_latency'] * 1000:.1f} ms to {last['median_latency'] * 1000:.1f} ms")
+    if last["db_size"] > first["db_size"] * args.max_db_growth:
+        problems.append(f"licenses.db grew from {first['db_size']} to {last['db_size']} bytes")
+    if first["open_files"] is not None and last["open_files"] - first["open_files"] > args.max_file_growth:
+        problems.append(f"open files grew from {first['open_files']} to {last['open_files']}")
+    if last["connections"] > first["connections"]:
+        problems.append(f"sqlite connections grew from {first['connections']} to {last['connections']}")
+    if last["traced_memory"] - first["traced_memory"] > args.max_memory_growth * 1024 * 1024:
+        problems.append(f"traced memory grew from {first['traced_memory']} to {last['traced_memory']} bytes")
+    return problems
+
+
+def main():
+    """Drives thousands of refresh cycles against the lmutil emulator and reports slowdowns and leaks."""
+    parser = argparse.ArgumentParser(description="Soak and load harness for the license refresh pipeline.")
+    parser.add_argument("--cycles", type=int, default=2000)
+    parser.add_argument("--window", type=int, default=100, help="cycles per reported window")
+    parser.add_argument("--features", type=int, default=8)
+    parser.add_argument("--seats", type=int, default=10, help="licenses issued per feature")
+    parser.add_argument("--churn", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.0, help="emulated lmutil latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--breaker-cooldown", type=float, default=2.0)
+    parser.add_argument("--snapshot-max-age", type=float, default=5.0, help="seconds; short, so pruning is exercised within the run")
+    parser.add_argument("--no-gui", action="store_true", help="skip display_filtered_output")
+    parser.add_argument("--workdir", help="defaults to a new temporary folder")
+    parser.add_argument("--csv", help="write per-cycle metrics to this file")
+    parser.add_argument("--max-latency-growth", type=float, default=2.0)
+    parser.add_argument("--max-db-growth", type=float, default=2.0)
+    parser.add_argument("--max-file-growth", type=int, default=5)
+    parser.add_argument("--max-memory-growth", type=float, default=10.0, help="MB")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="license_soak_"))
+    features = [f"feature_{i}" for i in range(args.features)]
+    users = ["jdoe", "asmith", "bwayne", "ckent", "dprince", "pparker"]
+    config = {
+        "features": {feature: args.seats for feature in features},
+        "users": users,
+        "churn": args.churn,
+        "latency": args.latency,
+        "failure_rate": args.failure_rate,
+        "state_file": os.path.join(workdir, "emulator_state.json"),
+    }
+    setup_workdir(workdir, features, users)
+    getLicenseStatus.LMUTIL_PATH = write_emulator_shim(workdir, config)
+    getLicenseStatus.BREAKER_COOLDOWN = args.breaker_cooldown
+    filterLicense.SNAPSHOT_MAX_AGE = args.snapshot_max_age
+    os.chdir(workdir)
+    print(f"Soak run of {args.cycles} cycles in {workdir}")
+
+    root, app, display = (None, None, None) if args.no_gui else start_gui()
+    if app is None and not args.no_gui:
+        print("The GUI could not be started; install Xvfb and pyvirtualdisplay or pass --no-gui.")
+        return 2
+    tracemalloc.start()
+    samples, windows, errors, stale = [], [], 0, 0
+    csv_file = open(args.csv, "w", newline="") if args.csv else None
+    writer = None
+    try:
+        for cycle in range(1, args.cycles + 1):
+            start = time.perf_counter()
+            fresh, error = run_cycle(root, app)
+            latency = time.perf_counter() - start
+            errors += error is not None
+            stale += not fresh
+
+            # Counting connections walks every object, so it is only done at window ends
+            at_window_end = cycle % args.window == 0
+            sample = {
+                "cycle": cycle,
+                "latency": latency,
+                "fresh": fresh,
+                "error": error,
+                "db_size": database_size(),
+                "open_files": count_open_files(),
+                "connections": count_sqlite_connections() if at_window_end else None,
+                "traced_memory": tracemalloc.get_traced_memory()[0],
+            }
+            samples.append(sample)
+            if csv_file:
+                if writer is None:
+                    writer = csv.DictWriter(csv_file, fieldnames=list(sample))
+                    writer.writeheader()
+                writer.writerow(sample)
+
+            if at_window_end:
+                windows.append(summarize_window(samples))
+                print_window(cycle, windows[-1])
+                samples = []
+    finally:
+        if csv_file:
+            csv_file.close()
+        if root is not None:
+            root.destroy()
+        if display is not None:
+            display.stop()
+
+    print(f"{errors} cycles raised errors, {stale} cycles served stale data.")
+    if len(windows) < 3:
+        print("Not enough windows to compare, increase --cycles.")
+        return 0
+
+    # The first window includes warm-up (imports, empty database), so compare from the second one
+    problems = find_regressions(windows[1], windows[-1], args)
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    if not problems:
+        print("No slowdowns or leaks detected.")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+import filterLicense
+import getLicenseStatus
+
+DB_FILE = "./database/licenses.db"
+OUTPUT_FOLDER = "./output"
+FILTERED_OUTPUT_FILE = f"{OUTPUT_FOLDER}/filtered_output.txt"
+STATE_FILE = f"{OUTPUT_FOLDER}/debug_log_state.json"
+LMSTAT_OUTPUT_FILE = f"{OUTPUT_FOLDER}/debug_log_lmstat.txt"   # own copy, other refreshes write output.txt
+DEBUG_LOG_FILE = r"C:\Program Files\ANSYS Inc\Shared Files\Licensing\license.log"
+POLL_INTERVAL = 1            # seconds between reads of the debug log
+RECONCILE_INTERVAL = 600     # seconds between lmstat reconciliation checks
+ROLLOVER_TOLERANCE = 60      # seconds a line may lag the previous one (daemons interleave) before it counts as the next day
+
+EVENT_PATTERN = re.compile(r'\s*(\d+:\d+:\d+) \((\S+)\) (OUT|IN|DENIED): "([^"]+)" (\S+)@(\S+)(.*)')
+TIME_PATTERN = re.compile(r"\s*(\d+):(\d+):(\d+) ")
+TIMESTAMP_PATTERN = re.compile(r"\s*\d+:\d+:\d+ \(\S+\) TIMESTAMP (\d+/\d+/\d+)")
+COUNT_PATTERN = re.compile(r"\((\d+) licenses\)")
+
+
+def parse_log_line(line, log_date):
+    """Parses one debug log line into an event dict, or returns None for other lines."""
+    match = EVENT_PATTERN.match(line)
+    if not match:
+        return None
+    event_time, daemon, action, feature, user, hostname, rest = match.groups()
+    count_match = COUNT_PATTERN.search(rest)
+    try:
+        stamp = datetime.strptime(f"{log_date} {event_time}", "%m/%d/%Y %H:%M:%S")
+    except ValueError:
+        stamp = datetime.now()
+    return {
+        "Action": action,
+        "License": feature,
+        "User": user,
+        "Hostname": hostname,
+        "Daemon": daemon,
+        "Count": int(count_match.group(1)) if count_match else 1,
+        "Time": stamp,
+    }
+
+
+def track_log_date(state, time_match):
+    """
+    Keeps state["date"] in step with the log. lmgrd writes no TIMESTAMP line at midnight,
+    so the date moves forward one day whenever the time of day jumps back.
+    """
+    hours, minutes, seconds = (int(value) for value in time_match.groups())
+    line_time = hours * 3600 + minutes * 60 + seconds
+    if "date" not in state:
+        state["date"] = datetime.now().strftime("%m/%d/%Y")
+    elif line_time < state.get("last_time", 0) - ROLLOVER_TOLERANCE:
+        next_day = datetime.strptime(state["date"], "%m/%d/%Y") + timedelta(days=1)
+        state["date"] = next_day.strftime("%m/%d/%Y")
+    state["last_time"] = line_time
+
+
+def read_new_events(log_file, state):
+    """
+    Reads the complete lines appended to the debug log since the stored offset.
+    A changed file identity or a file shorter than the offset is treated as a rotation
+    and reading restarts from the beginning. Returns (events, rotated).
+    """
+    if not os.path.exists(log_file):
+        return [], False
+
+    stat = os.stat(log_file)
+    rotated = stat.st_ino != state.get("inode") or stat.st_size < state.get("offset", 0)
+    if rotated:
+        state["inode"] = stat.st_ino
+        state["offset"] = 0
+
+    with open(log_file, "rb") as infile:
+        infile.seek(state["offset"])
+        chunk = infile.read()
+
+    # Leave a partially written last line for the next read
+    end = chunk.rfind(b"\n") + 1
+    state["offset"] += end
+
+    events = []
+    for raw_line in chunk[:end].decode("utf-8", errors="replace").splitlines():
+        time_match = TIME_PATTERN.match(raw_line)
+        if time_match:
+            track_log_date(state, time_match)
+        timestamp_match = TIMESTAMP_PATTERN.match(raw_line)
+        if timestamp_match:
+            state["date"] = timestamp_match.group(1)
+            continue
+        event = parse_log_line(raw_line, state.get("date", datetime.now().strftime("%m/%d/%Y")))
+        if event:
+            events.append(event)
+    return events, rotated
+
+
+def apply_event(license_data, event):
+    """Applies a single OUT/IN/DENIED event to the usage model. Returns True if the model changed."""
+    data = license_data.get(event["License"])
+    if data is None:
+        return False
+
+    if event["Action"] == "OUT":
+        # lmstat lists a multi-license checkout as one row, so the model does too
+        stamp = event["Time"]
+        data["users"].append({
+            "User": event["User"],
+            "Hostname": event["Hostname"],
+            "Display": event["Hostname"],
+            "PID": None,
+            "Version": None,
+            "Server": None,
+            "Start_day": stamp.strftime("%a"),
+            "Start_date": f"{stamp.month}/{stamp.day}",
+            "Start_time": f"{stamp.hour}:{stamp.minute:02d}",
+            "Count": event["Count"],
+        })
+        data["used"] += event["Count"]
+    elif event["Action"] == "IN":
+        # Prefer the checkout of the same size, then any checkout by the same user and host
+        matches = [i for i, user in enumerate(data["users"]) if user["User"] == event["User"] and user["Hostname"] == event["Hostname"]]
+        same_size = [i for i in matches if data["users"][i].get("Count", 1) == event["Count"]]
+        if matches:
+            del data["users"][(same_size or matches)[0]]
+            data["used"] = max(0, data["used"] - event["Count"])
+        else:
+            # Seats checked out before the last reconciliation and not listed by lmstat
+            unaccounted = data["used"] - sum(user.get("Count", 1) for user in data["users"])
+            data["used"] -= max(0, min(event["Count"], unaccounted))
+    else:
+        data["denied"] = data.get("denied", 0) + event["Count"]
+    return True
+
+
+def replay_log(log_file, license_data):
+    """Applies every event in a recorded debug log to the usage model."""
+    state = {}
+    events, _ = read_new_events(log_file, state)
+    for event in events:
+        apply_event(license_data, event)
+    return license_data
+
+
+def load_state():
+    """Loads the saved log offset and usage model, if any."""
+    if not os.path.exists(STATE_FILE):
+        return {}
+    try:
+        with open(STATE_FILE, "r") as file:
+            return json.load(file)
+    except (ValueError, OSError):
+        return {}
+
+
+def save_state(state, license_data):
+    """Saves the log offset together with the usage model it corresponds to."""
+    state["license_data"] = license_data
+    temp_file = f"{STATE_FILE}.tmp"
+    with open(temp_file, "w") as file:
+        json.dump(state, file)
+    os.replace(temp_file, STATE_FILE)
+
+
+def reconcile(target_licenses, license_data):
+    """Rebuilds the usage model from a fresh lmstat dump, keeping the DENIED counters."""
+    if not getLicenseStatus.main(LMSTAT_OUTPUT_FILE) and license_data:
+        return license_data  # Server unreachable, lmstat output is stale
+    fresh_data = filterLicense.parse_output_file(LMSTAT_OUTPUT_FILE, target_licenses)
+    for lic, data in fresh_data.items():
+        old = license_data.get(lic)
+        if old is None:
+            continue
+        if old["used"] != data["used"]:
+            print(f"Reconciled {lic}: log model had {old['used']} in use, lmstat reports {data['used']}.")
+        if "denied" in old:
+            data["denied"] = old["denied"]
+    return fresh_data
+
+
+def publish(license_data):
+    """
+    Writes the usage model to the database as a live feed snapshot, which the GUI shows
+    instead of running lmstat while the tailer keeps it current, and as plain text to the
+    filtered output file.
+    """
+    conn, cursor = filterLicense.setup_database(DB_FILE)
+    filterLicense.insert_into_database(cursor, conn, license_data, filterLicense.SOURCE_DEBUG_LOG)
+    filterLicense.save_filtered_output(FILTERED_OUTPUT_FILE, license_data)
+    conn.close()
+
+
+def main():
+    """Follows the debug log and keeps the usage model up to date between lmstat reconciliations."""
+    conn, cursor = filterLicense.setup_database(DB_FILE)
+    target_licenses = filterLicense.load_target_licenses(cursor)
+    conn.close()
+    if not target_licenses:
+        print("No target licenses specified. Please add licenses to the database.")
+        exit(1)
+
+    state = load_state()
+    license_data = state.pop("license_data", None)
+    if license_data is None or not os.path.exists(DEBUG_LOG_FILE) or os.stat(DEBUG_LOG_FILE).st_ino != state.get("inode"):
+        # No usable resume point: start from lmstat and follow only new log lines
+        license_data = reconcile(target_licenses, {})
+        if os.path.exists(DEBUG_LOG_FILE):
+            stat = os.stat(DEBUG_LOG_FILE)
+            state = {"inode": stat.st_ino, "offset": stat.st_size}
+    publish(license_data)
+    last_reconcile = time.time()
+
+    save_state(state, license_data)
+
+    while True:
+        last_offset = state.get("offset")
+        events, rotated = read_new_events(DEBUG_LOG_FILE, state)
+        changed = False
+        for event in events:
+            changed = apply_event(license_data, event) or changed
+
+        # Lines written to the old file after our offset are lost on rotation
+        if rotated or time.time() - last_reconcile >= RECONCILE_INTERVAL:
+            license_data = reconcile(target_licenses, license_data)
+            last_reconcile = time.time()
+            changed = True
+
+        if changed:
+            publish(license_data)
+        if changed or state.get("offset") != last_offset:
+            save_state(state, license_data)
+        time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()